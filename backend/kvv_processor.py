@@ -1,12 +1,19 @@
 import requests
 import json
 import os
+import sys
+import sqlite3
+import argparse
 from datetime import datetime, timedelta
 
 # --- НАСТРОЙКИ ---
 STOP_ID = "7001862"  # Bad Schönborn Süd
 BASE_URL = "http://www.kvv.de/tunnelEfaDirect.php"
 
+# Локальное хранилище сырых отправлений (пересобирается без запросов к API)
+DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "departures.db")
+KEEP_DAYS = 14  # Сколько дней хранить сырые данные (~1 МБ в день)
+
 REPLACEMENTS = {
     "Hauptbahnhof": "Hbf",
     "Bahnhof": "Bhf",
@@ -14,25 +21,83 @@ REPLACEMENTS = {
     "Platz": "Pl.",
 }
 
-def shorten_text(text):
+# Выходные файлы: каждый со своим фильтром линий и длиной направления.
+# "lines" - префиксы ("S" -> S1, S3, S33), "exact" - точные номера линий.
+# Один запрос к API -> сколько угодно табло.
+OUTPUTS = [
+    {"path": "offline_data.py", "lines": ("S",), "max_len": 22},
+    # Пример: отдельное табло только для трамваев 1-5 (без 10-19 и автобусов)
+    # {"path": "offline_tram.py", "exact": ("1", "2", "3", "4", "5"), "max_len": 19},
+]
+
+def shorten_text(text, max_len=22):
     for full, short in REPLACEMENTS.items():
         text = text.replace(full, short)
-    if len(text) > 22: text = text[:22] + "."
+    if len(text) > max_len: text = text[:max_len] + "."
     return text
 
-def main():
-    print("🚀 Running KVV Update Action...")
-    
-    # Берем "завтра", чтобы получить полные сутки с 00:00
-    tomorrow = datetime.now() + timedelta(days=1)
-    
+# --- ХРАНИЛИЩЕ ---
+def open_store(path=DB_PATH):
+    db = sqlite3.connect(path)
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS departures (
+            stop_id   TEXT    NOT NULL,
+            date      TEXT    NOT NULL,
+            hour      INTEGER NOT NULL,
+            minute    INTEGER NOT NULL,
+            line      TEXT    NOT NULL,
+            direction TEXT    NOT NULL,
+            raw       TEXT    NOT NULL,
+            PRIMARY KEY (stop_id, date, hour, minute, line, direction)
+        )
+    """)
+    return db
+
+def store_departures(db, stop_id, raw_list, replace_date=None):
+    """
+    Сохраняет сырые отправления как есть, дубликаты отбрасываются ключом.
+    replace_date: сначала удалить все строки за этот день (полная выгрузка),
+    чтобы отменённые/перенесённые рейсы не оставались в хранилище.
+    """
+    rows = []
+    for dep in raw_list:
+        dt = dep.get('dateTime', {})
+        try:
+            date = "{:04d}-{:02d}-{:02d}".format(int(dt['year']), int(dt['month']), int(dt['day']))
+            h = int(dt['hour'])
+            m = int(dt.get('minute', 0))
+        except (KeyError, ValueError, TypeError):
+            continue # Пропускаем только битую строку
+        line = dep.get('servingLine', {}).get('symbol', '?')
+        direction = dep.get('servingLine', {}).get('direction', 'Unknown')
+        rows.append((stop_id, date, h, m, line, direction, json.dumps(dep, ensure_ascii=False)))
+
+    with db: # Одна транзакция: удаление + вставка
+        if replace_date:
+            db.execute("DELETE FROM departures WHERE stop_id = ? AND date = ?", (stop_id, replace_date))
+        db.executemany("INSERT OR REPLACE INTO departures VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    return len(rows)
+
+def prune_store(db, before_date):
+    """Удаляет все дни раньше before_date (YYYY-MM-DD), чтобы база не росла"""
+    with db:
+        cur = db.execute("DELETE FROM departures WHERE date < ?", (before_date,))
+    if cur.rowcount:
+        print(f"🧹 Pruned {cur.rowcount} departures before {before_date}.")
+
+def count_departures(db, stop_id, date):
+    cur = db.execute("SELECT COUNT(*) FROM departures WHERE stop_id = ? AND date = ?", (stop_id, date))
+    return cur.fetchone()[0]
+
+def fetch_day(db, stop_id, day):
     date_params = {
-        "itdDateYear": tomorrow.year,
-        "itdDateMonth": tomorrow.month,
-        "itdDateDay": tomorrow.day
+        "itdDateYear": day.year,
+        "itdDateMonth": day.month,
+        "itdDateDay": day.day
     }
-    
-    final_schedule = {}
+
+    raw_list = []
+    failed = False
 
     # Проходим по часам 0-23
     for hour in range(24):
@@ -44,7 +109,7 @@ def main():
             "type_dm": "any",
             "useRealtime": "0",
             "limit": "100", # Берем с запасом!
-            "name_dm": STOP_ID,
+            "name_dm": stop_id,
             "time": f"{hour:02d}:00",
             **date_params
         }
@@ -52,44 +117,102 @@ def main():
         try:
             resp = requests.get(BASE_URL, params=params, timeout=30)
             data = resp.json()
-            raw_list = data.get('departureList', [])
-            deps_for_hour = []
-            
-            for dep in raw_list:
-                dt = dep.get('dateTime', {})
-                h = int(dt.get('hour', -1))
-                
-                # Строгий фильтр по часу
-                if h != hour: continue
-                
-                # Фильтр S-Bahn
-                line = dep.get('servingLine', {}).get('symbol', '?')
-                if not line.startswith('S'): continue
-                
-                m = int(dt.get('minute', 0))
-                direction = dep.get('servingLine', {}).get('direction', 'Unknown')
-                if '>' in direction: direction = direction.split('>')[0].strip()
-                
-                entry = (m, line, shorten_text(direction))
-                if entry not in deps_for_hour:
-                    deps_for_hour.append(entry)
-            
-            deps_for_hour.sort(key=lambda x: x[0])
-            final_schedule[hour] = deps_for_hour
-
+            raw_list.extend(data.get('departureList', []) or [])
         except Exception as e:
             print(f"Error on hour {hour}: {e}")
-            final_schedule[hour] = []
+            failed = True
+
+    if failed:
+        # Неполная выгрузка: не удаляем старые данные, только дополняем
+        print("⚠️ Incomplete fetch, merging with stored departures.")
+        store_departures(db, stop_id, raw_list)
+    else:
+        store_departures(db, stop_id, raw_list, replace_date=day.strftime("%Y-%m-%d"))
+
+    prune_store(db, (day - timedelta(days=KEEP_DAYS)).strftime("%Y-%m-%d"))
 
-    # Записываем файл offline_data.py
-    with open("offline_data.py", "w", encoding="utf-8") as f:
+# --- ПАЙПЛАЙН ---
+def line_matches(line, lines=None, exact=None):
+    """Фильтр линий: без фильтров - все, иначе префикс или точное совпадение"""
+    if not lines and not exact:
+        return True
+    if exact and line in exact:
+        return True
+    return bool(lines) and line.startswith(tuple(lines))
+
+def build_schedule(db, stop_id, date, lines=None, max_len=22, exact=None):
+    """Собирает SCHEDULE {час: [(мин, линия, направление)]} из хранилища"""
+    schedule = {h: [] for h in range(24)}
+    cur = db.execute(
+        "SELECT hour, minute, line, direction FROM departures "
+        "WHERE stop_id = ? AND date = ? ORDER BY hour, minute",
+        (stop_id, date)
+    )
+    for h, m, line, direction in cur:
+        # Фильтр по линиям (например, S-Bahn)
+        if not line_matches(line, lines, exact): continue
+
+        if '>' in direction: direction = direction.split('>')[0].strip()
+
+        entry = (m, line, shorten_text(direction, max_len))
+        if entry not in schedule[h]:
+            schedule[h].append(entry)
+    return schedule
+
+def write_schedule(path, schedule):
+    with open(path, "w", encoding="utf-8") as f:
         f.write(f"# Auto-generated via GitHub Actions: {datetime.now()}\n")
         f.write("SCHEDULE = {\n")
         for h in range(24):
-            f.write(f"    {h}: {str(final_schedule[h])},\n")
+            f.write(f"    {h}: {str(schedule[h])},\n")
         f.write("}\n")
-    
-    print("✅ Done. offline_data.py updated.")
+
+def run_pipeline(db, stop_id, date, outputs=OUTPUTS):
+    for out in outputs:
+        schedule = build_schedule(db, stop_id, date, out.get("lines"),
+                                  out.get("max_len", 22), out.get("exact"))
+        write_schedule(out["path"], schedule)
+        print(f"✅ {out['path']} updated.")
+
+def main():
+    parser = argparse.ArgumentParser(description="KVV schedule fetcher")
+    parser.add_argument("--no-fetch", action="store_true",
+                        help="only rebuild outputs from the local store")
+    parser.add_argument("--date", help="YYYY-MM-DD (default: tomorrow)")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--list-outputs", action="store_true",
+                        help="print configured output paths and exit")
+    args = parser.parse_args()
+
+    if args.list_outputs:
+        for out in OUTPUTS:
+            print(out["path"])
+        return
+
+    print("🚀 Running KVV Update Action...")
+
+    # Берем "завтра", чтобы получить полные сутки с 00:00
+    if args.date:
+        try:
+            day = datetime.strptime(args.date, "%Y-%m-%d")
+        except ValueError:
+            parser.error(f"invalid --date '{args.date}', expected YYYY-MM-DD")
+    else:
+        day = datetime.now() + timedelta(days=1)
+
+    db = open_store(args.db)
+    try:
+        if not args.no_fetch:
+            fetch_day(db, STOP_ID, day)
+        date = day.strftime("%Y-%m-%d")
+        # Пустое хранилище не должно затирать табло пустым планом
+        if count_departures(db, STOP_ID, date) == 0:
+            sys.exit(f"❌ No departures stored for {date}, outputs left unchanged.")
+        run_pipeline(db, STOP_ID, date)
+    finally:
+        db.close()
+
+    print("✅ Done.")
 
 if __name__ == "__main__":
     main()
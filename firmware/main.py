@@ -19,6 +19,17 @@ LAT = "49.2208"
 LON = "8.6469"
 WEATHER_URL = f"http://api.open-meteo.com/v1/forecast?latitude={LAT}&longitude={LON}&current_weather=true"
 
+# --- SCHEDULER ---
+POLL_INTERVAL_MS = 30000      # Live departures refresh
+RECONNECT_INTERVAL_MS = 15000 # WiFi reconnect attempts while offline
+UPDATE_RETRY_MS = 600000      # Pause between failed GitHub updates
+NTP_MAX_ATTEMPTS = 3          # Then trust the RTC if NTP is blocked
+RTC_SAVE_INTERVAL_MS = 900000 # Clock backup to flash (plus after each NTP sync)
+# lightsleep saves more power, but the WiFi link may drop on some builds
+USE_LIGHTSLEEP = False
+# Show the offline plan right after power-on, bring up WiFi/NTP in the background
+FAST_BOOT = True
+
 # --- DISPLAY ---
 SPI_PORT = 2
 SCK_PIN = 18
@@ -27,14 +38,15 @@ CS_PIN = 5
 DC_PIN = 17
 RST_PIN = 16
 
-# Display reset
-rst = Pin(RST_PIN, Pin.OUT)
-rst.value(1)
-time.sleep(0.1)
-rst.value(0)
-time.sleep(0.2)
-rst.value(1)
-time.sleep(0.5)
+# Display reset (the driver resets the panel again in init_display)
+if not FAST_BOOT:
+    rst = Pin(RST_PIN, Pin.OUT)
+    rst.value(1)
+    time.sleep(0.1)
+    rst.value(0)
+    time.sleep(0.2)
+    rst.value(1)
+    time.sleep(0.5)
 
 spi = SPI(SPI_PORT, baudrate=10000000, sck=Pin(SCK_PIN), mosi=Pin(MOSI_PIN))
 display = ssd1322.SSD1322(256, 64, spi, Pin(RST_PIN), Pin(CS_PIN), Pin(DC_PIN))
@@ -50,6 +62,7 @@ except:
 rtc = RTC()
 last_weather = "" 
 update_done_today = False 
+first_frame_ms = None
 
 # Safe data import
 try:
@@ -106,7 +119,7 @@ def wifi_reset():
     except:
         pass
 
-def safe_connect():
+def safe_connect(wait_s=10):
     """Connection with Internal State Error protection"""
     if wlan.isconnected():
         return True
@@ -119,7 +132,7 @@ def safe_connect():
         wifi_reset()
         
     # Wait for connection
-    for _ in range(10):
+    for _ in range(wait_s):
         if wlan.isconnected():
             return True
         time.sleep(1)
@@ -132,32 +145,57 @@ def sync_time():
     except:
         return False
 
+def save_rtc():
+    """Save current UTC timestamp to flash (restored on cold boot)"""
+    try:
+        with open('last_rtc.txt', 'w') as f:
+            f.write(str(time.time()))
+    except: pass
+
+def restore_rtc():
+    """Restore RTC from flash if it was lost (power-on resets it to 2000)"""
+    if time.gmtime()[0] >= 2024:
+        return True # Survived soft reset
+    try:
+        with open('last_rtc.txt', 'r') as f:
+            u = time.gmtime(int(f.read().strip()))
+        # (year, month, day, weekday, hours, minutes, seconds, subseconds)
+        rtc.datetime((u[0], u[1], u[2], u[6], u[3], u[4], u[5], 0))
+        return True
+    except:
+        return False
+
 # --- ROBUST TIME FUNCTION (Logic based, No mktime) ---
+_dst_cache = None  # (year, (3, day, 1), (10, day, 1))
+
+def get_dst_switches(year):
+    """
+    Returns the UTC (month, day, hour) of this year's CEST start and end.
+    Computed once per year (Gauss algorithm for last Sunday).
+    """
+    global _dst_cache
+    if _dst_cache is None or _dst_cache[0] != year:
+        march_last_sunday = 31 - (int(5 * year / 4 + 4) % 7)
+        oct_last_sunday = 31 - (int(5 * year / 4 + 1) % 7)
+        _dst_cache = (year, (3, march_last_sunday, 1), (10, oct_last_sunday, 1))
+    return _dst_cache[1], _dst_cache[2]
+
 def get_cet_time():
     """
     Returns local time (tuple) for Germany (CET/CEST).
     Uses logical date comparison instead of mktime to avoid OS dependencies.
     """
-    # Get UTC time
-    utc = time.gmtime()
-    # Unpack (year, month, day, hour)
-    year, month, day, hour = utc[0], utc[1], utc[2], utc[3]
-
-    # Gauss algorithm for last Sunday
-    march_last_sunday = 31 - (int(5 * year / 4 + 4) % 7)
-    oct_last_sunday = 31 - (int(5 * year / 4 + 1) % 7)
-
-    # Logical DST determination
-    is_dst = (
-        (month > 3 and month < 10) or
-        (month == 3 and (day > march_last_sunday or (day == march_last_sunday and hour >= 1))) or
-        (month == 10 and (day < oct_last_sunday or (day == oct_last_sunday and hour < 1)))
-    )
+    now = time.time()
+    utc = time.gmtime(now)
+    dst_start, dst_end = get_dst_switches(utc[0])
+
+    # Switches happen at 01:00 UTC, compare (month, day, hour)
+    is_dst = dst_start <= (utc[1], utc[2], utc[3]) < dst_end
 
     offset = 2 if is_dst else 1
     
     # Add offset to current UTC timestamp and convert back
-    return time.gmtime(time.time() + offset * 3600)
+    return time.gmtime(now + offset * 3600)
 
 def get_static_schedule(current_h, current_m):
     if offline_data is None or not hasattr(offline_data, 'SCHEDULE'):
@@ -259,7 +297,7 @@ def get_live_schedule():
             gc.collect()
     return None 
 
-def update_display(deps, time_str, online):
+def update_display(deps, time_str, online, verified=True):
     display.fill(0)
     display.text("Bad Schonborn", 0, 2, 15)
     draw_umlaut_o(56, 2) 
@@ -267,6 +305,9 @@ def update_display(deps, time_str, online):
     # Shifted time
     time_x = 190
     display.text(time_str, time_x + 26, 2, 15)
+    if not verified:
+        # Clock not confirmed by NTP yet (restored from flash)
+        display.text("*", time_x + 18, 2, 10)
     
     cursor_x = 216 
     # Weather only if online
@@ -307,6 +348,34 @@ def update_display(deps, time_str, online):
             cnt += 1
     display.show()
 
+def draw_frame(deps, time_str, online, clock_valid, verified):
+    """Departures if there is anything to show, otherwise a status screen"""
+    if deps or clock_valid:
+        update_display(deps, time_str if clock_valid else "--:--", online, verified)
+    else:
+        show_status("Waiting for time..." if online else "Waiting for WiFi...")
+    report_first_frame(bool(deps))
+
+def report_first_frame(had_deps):
+    """Print and store boot-to-first-frame time (once per boot)"""
+    global first_frame_ms
+    if first_frame_ms is not None:
+        return
+    first_frame_ms = time.ticks_ms()
+    print(f"First frame after {first_frame_ms} ms (departures: {had_deps})")
+    try:
+        # Format: "<ms> <1 if departures shown else 0>"
+        with open('boot_ms.txt', 'w') as f:
+            f.write("{} {}".format(first_frame_ms, 1 if had_deps else 0))
+    except: pass
+
+def idle(ms):
+    """Sleep until the next deadline, using lightsleep if enabled"""
+    if USE_LIGHTSLEEP:
+        machine.lightsleep(ms)
+    else:
+        time.sleep_ms(ms)
+
 def show_status(msg):
     display.fill(0)
     display.text("System Info", 0, 2, 15)
@@ -337,7 +406,8 @@ def check_if_updated_today():
     except: pass
     return False
 
-def main():
+def slow_boot():
+    """Blocking start: wait for WiFi and NTP before the first departures"""
     global update_done_today
     
     display.fill(0); display.text("System Start...", 0, 30, 15); display.show()
@@ -375,11 +445,52 @@ def main():
             show_status("Download Failed!")
             time.sleep(2)
 
-    last_update = 0
+def fast_boot():
+    """Show the offline plan immediately, connect WiFi in the background"""
+    print("Start (fast boot)")
+    clock_valid = restore_rtc()
+    deps = None
+    time_str = "--:--"
+    if clock_valid:
+        t = get_cet_time()
+        deps = get_static_schedule(t[3], t[4])
+        time_str = "{:02d}:{:02d}".format(t[3], t[4])
+    # First boot ever (no clock): status screen until NTP
+    draw_frame(deps, time_str, False, clock_valid, False)
+    
+    # Non-blocking, the main loop picks up the connection
+    try:
+        wlan.connect(WIFI_SSID, WIFI_PASS)
+    except OSError as e:
+        print(f"WiFi Error detected: {e}")
+    return clock_valid
+
+def main():
+    global update_done_today
+    
+    if FAST_BOOT:
+        clock_valid = fast_boot()
+        clock_settled = False
+    else:
+        slow_boot()
+        clock_valid = True
+        clock_settled = True
+    time_synced = not FAST_BOOT
+
+    last_update = None
     reconnect_timer = 0
     last_retry_time = 0 
+    last_minute = -1
+    last_ntp_hour = -1
+    ntp_attempts = 0
+    last_rtc_save = time.ticks_ms()
+    last_online = None
+    deps = None
+    deps_online = False
     
     # --- 3. MAIN LOOP ---
+    # Event driven: sleep until the next deadline (minute boundary, poll,
+    # reconnect, update retry) instead of waking every 0.5 s.
     while True:
         now = time.ticks_ms()
         
@@ -390,17 +501,49 @@ def main():
         time_str = "{:02d}:{:02d}".format(h, m)
         
         online = wlan.isconnected()
+        if online != last_online:
+            last_update = None # Connection changed: refresh right away
+            last_online = online
         
         # Reset update flag at 2 AM
         if h == 2: update_done_today = False
         
+        # --- FIRST TIME SYNC (fast boot) ---
+        if online and not clock_settled:
+            if sync_time():
+                time_synced = True
+            else:
+                ntp_attempts += 1
+                print(f"NTP failed ({ntp_attempts}/{NTP_MAX_ATTEMPTS})")
+            if time_synced or ntp_attempts >= NTP_MAX_ATTEMPTS:
+                # Synced, or NTP blocked: carry on with the RTC like before
+                # (unless it still holds the power-on date, year 2000)
+                clock_settled = True
+                clock_valid = time_synced or time.gmtime()[0] >= 2024
+                last_update = None
+                if clock_valid:
+                    save_rtc()
+                    last_rtc_save = now
+                if check_if_updated_today():
+                    print("Already updated today.")
+                    update_done_today = True
+                t = get_cet_time()
+                h = t[3]
+                m = t[4]
+                time_str = "{:02d}:{:02d}".format(h, m)
+        
         # --- UPDATE LOGIC ---
-        if h >= 3 and online and not update_done_today:
+        # Missing offline data is downloaded right away, like the old file check
+        # The daily window needs a trusted clock
+        update_pending = online and clock_settled and (
+            offline_data is None or (clock_valid and h >= 3 and not update_done_today))
+        if update_pending:
             # Pause between attempts (10 minutes)
-            if time.ticks_diff(now, last_retry_time) > 600000 or last_retry_time == 0:
+            if time.ticks_diff(now, last_retry_time) > UPDATE_RETRY_MS or last_retry_time == 0:
                 show_status("Updating Schedule...")
                 if schedule_updater.update_from_github():
-                    save_update_date() # Record that we updated today
+                    if clock_valid:
+                        save_update_date() # Record that we updated today
                     # Success -> Countdown 10 sec
                     for i in range(10, 0, -1):
                         show_status(f"Updated! Reboot {i}s")
@@ -410,19 +553,25 @@ def main():
                     last_retry_time = now # Remember failure time
                     show_status("Update Fail. Retry later.")
                     time.sleep(2)
+                    last_minute = -1 # Status screen shown, force redraw
 
         # --- WIFI MANAGEMENT ---
         if not online:
-            if time.ticks_diff(now, reconnect_timer) > 15000:
+            if time.ticks_diff(now, reconnect_timer) > RECONNECT_INTERVAL_MS:
                 reconnect_timer = now
-                safe_connect() 
-        else:
-            # Sync time once an hour (at 00 minutes)
-            if t[4] == 0 and t[5] < 5:
-                sync_time()
+                safe_connect(wait_s=0) # Don't block, next pass checks again
+        
+        # Sync time once an hour (at 00 minutes)
+        if online and clock_settled and m == 0 and h != last_ntp_hour:
+            if sync_time():
+                last_ntp_hour = h
+                time_synced = True
+                clock_valid = True
+                save_rtc()
+                last_rtc_save = now
 
         # --- DISPLAY UPDATE ---
-        if time.ticks_diff(now, last_update) > 30000:
+        if last_update is None or time.ticks_diff(now, last_update) >= POLL_INTERVAL_MS:
             print("Upd...", end=" ")
             gc.collect()
             
@@ -431,16 +580,38 @@ def main():
                 deps = get_live_schedule()
             
             if deps:
-                update_display(deps, time_str, True)
+                deps_online = True
                 print("Online")
             else:
                 print("Offline")
-                deps = get_static_schedule(h, m)
-                update_display(deps, time_str, online)
+                deps_online = False
+                deps = get_static_schedule(h, m) if clock_valid else None
+            draw_frame(deps, time_str, deps_online or online, clock_valid, time_synced)
             
             last_update = now
-            
-        time.sleep(0.5)
+        elif m != last_minute:
+            # Minute boundary: refresh clock (and offline countdowns) without network
+            if not deps_online:
+                deps = get_static_schedule(h, m) if clock_valid else None
+            draw_frame(deps, time_str, deps_online or online, clock_valid, time_synced)
+        
+        last_minute = m
+        
+        # Periodic clock backup (restored on cold boot)
+        if clock_valid and time.ticks_diff(now, last_rtc_save) >= RTC_SAVE_INTERVAL_MS:
+            save_rtc()
+            last_rtc_save = now
+        
+        # --- SLEEP UNTIL NEXT DEADLINE ---
+        now = time.ticks_ms()
+        wait = (60 - time.gmtime()[5]) * 1000
+        if last_update is not None:
+            wait = min(wait, POLL_INTERVAL_MS - time.ticks_diff(now, last_update))
+        if not online:
+            wait = min(wait, RECONNECT_INTERVAL_MS - time.ticks_diff(now, reconnect_timer))
+        if update_pending and last_retry_time:
+            wait = min(wait, UPDATE_RETRY_MS - time.ticks_diff(now, last_retry_time))
+        idle(max(wait, 100))
 
 if __name__ == '__main__':
     main()